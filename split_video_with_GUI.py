@@ -6,14 +6,19 @@
 
 import subprocess
 import os
-import math
 import sys
 import threading
+import queue
+import asyncio
+import bisect
+import itertools
 import customtkinter as ctk
 from tkinter import filedialog
-from datetime import datetime
 import time 
-import re
+import re # Also needed at import time by the FFmpeg progress patterns below
+
+# Modules used by a single step (datetime, json, csv) are imported where they are needed,
+# keeping them off the startup path.
 
 # --- GLOBAL VARIABLES AND EXECUTABLE CONFIGURATION ---
 
@@ -24,13 +29,63 @@ SCRIPT_DIR = os.path.dirname(sys.argv[0])
 FFMPEG_EXE = os.path.join(SCRIPT_DIR, "ffmpeg.exe")
 FFPROBE_EXE = os.path.join(SCRIPT_DIR, "ffprobe.exe")
 
-# Working H.264 encoding parameters (Windows/VLC compatibility)
-# FIX: Corrected "libx64" to "libx264"
-FFMPEG_ARGS = ["-c:v", "libx264", "-crf", "23", "-preset", "medium", "-c:a", "aac", "-b:a", "128k"]
+# Windows: start FFmpeg/FFprobe without a console window (no flashing window per process)
+if sys.platform == "win32":
+    _startupinfo = subprocess.STARTUPINFO()
+    _startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    SUBPROCESS_KWARGS = {"creationflags": subprocess.CREATE_NO_WINDOW, "startupinfo": _startupinfo}
+else:
+    SUBPROCESS_KWARGS = {}
+
+# Read buffer for FFmpeg's stderr (progress + log), drained while FFmpeg runs
+STDERR_BUFFER_SIZE = 1 << 20
+# Bytes of FFmpeg log kept for error messages (the end of the log explains the failure)
+STDERR_TAIL_SIZE = 4096
+
+# Working H.264 encoding parameters (Windows/VLC compatibility), see _build_ffmpeg_args.
+# The preset and CRF are selected in the GUI.
+X264_PRESETS = ("ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow")
+X264_PRESET_DEFAULT = "faster"
+X264_CRF_VALUES = tuple(str(crf) for crf in range(18, 29))
+X264_CRF_DEFAULT = "23"
+
+# Hardware H.264 encoders, offered when FFmpeg has them and a test encode works.
+# The CRF value is used as their constant quality level.
+HW_ENCODERS = ("h264_nvenc", "h264_qsv", "h264_amf")
+SW_ENCODER = "libx264"
+# Consumer GPUs limit the number of concurrent encoding sessions
+HW_ENCODER_MAX_PROCESSES = 2
+
+# Fast mode: stream copy (no decoding/encoding) for sources already in compatible codecs
+FFMPEG_ARGS_FAST = ["-c", "copy", "-avoid_negative_ts", "make_zero"]
+FAST_VIDEO_CODECS = ("h264", "hevc", "av1")
+FAST_AUDIO_CODECS = ("aac", "mp3", "opus")
+
+# Machine-readable progress (key=value lines) on stderr, parsed while FFmpeg runs.
+# The log itself is limited to errors, which are kept for the error popup.
+FFMPEG_PROGRESS_ARGS = ["-progress", "pipe:2", "-nostats", "-loglevel", "error"]
+# Encoded time in microseconds (out_time_ms carries the same value, despite its name)
+FFMPEG_PROGRESS_RE = re.compile(rb"^out_time_us=(\d+)")
+# Any key=value line is progress: some values are padded (e.g. "bitrate= 512.0kbits/s")
+FFMPEG_PROGRESS_LINE_RE = re.compile(rb"^\w+=")
 
 # Default maximum desired segment size in bytes (200 MB)
 MAX_SIZE_DEFAULT_BYTES = 209715200
 
+# Encoder threads given to each FFmpeg process; the remaining cores are used
+# to encode several segments at the same time.
+FFMPEG_THREADS_PER_PROCESS = 4
+FFMPEG_MAX_PROCESSES = max(1, (os.cpu_count() or 1) // FFMPEG_THREADS_PER_PROCESS)
+
+# Planned segments target this fraction of the max size, leaving headroom for
+# bitrate variations within the segment.
+PLAN_SIZE_MARGIN = 0.9
+
+# GUI updates from background threads go through a queue, applied by a single
+# Tk timer: at most GUI_QUEUE_BATCH messages every GUI_QUEUE_INTERVAL_MS.
+GUI_QUEUE_INTERVAL_MS = 100
+GUI_QUEUE_BATCH = 50
+
 # --- UTILITY FUNCTIONS ---
 
 def _format_seconds(seconds):
@@ -41,16 +96,457 @@ def _format_seconds(seconds):
     else:
         return time.strftime('%M:%S', time.gmtime(seconds))
 
+def _seconds_to_us(seconds):
+    """Converts a time in seconds (as printed by FFprobe, e.g. "12.345678") to integer microseconds."""
+    return round(float(seconds) * 1_000_000)
+
+def _us_to_timestamp(us):
+    """Formats integer microseconds as an exact seconds value for FFmpeg (e.g. "12.345678")."""
+    return f"{us // 1_000_000}.{us % 1_000_000:06d}"
+
 def _format_bytes(size_bytes):
     """Converts bytes into a readable format (KB, MB, GB)."""
     if size_bytes is None or size_bytes == 0:
         return "N/A"
     size_name = ("Bytes", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB")
-    i = int(math.floor(math.log(size_bytes, 1024)))
-    p = math.pow(1024, i)
+    # Each unit is 10 bits (1024x) larger: the unit index comes from the integer bit length
+    i = min(len(size_name) - 1, max(0, (int(size_bytes).bit_length() - 1) // 10))
+    p = 1 << (i * 10)
     s = round(size_bytes / p, 2)
     return f"{s} {size_name[i]}"
 
+def _detect_hw_encoders():
+    """Returns the hardware H.264 encoders usable on this machine (may take a few seconds)."""
+    try:
+        result = subprocess.run([FFMPEG_EXE, "-hide_banner", "-encoders"], capture_output=True, text=True, timeout=5, **SUBPROCESS_KWARGS)
+    except (OSError, subprocess.TimeoutExpired):
+        return []
+    
+    available = []
+    for encoder in HW_ENCODERS:
+        if encoder not in result.stdout:
+            continue
+        # FFmpeg builds list these encoders even without the matching GPU/driver: try one frame
+        try:
+            test = subprocess.run([
+                FFMPEG_EXE, "-hide_banner", "-loglevel", "error", 
+                "-f", "lavfi", "-i", "color=size=256x256:duration=0.1", 
+                "-frames:v", "1", "-c:v", encoder, "-f", "null", "-"
+            ], capture_output=True, timeout=10, **SUBPROCESS_KWARGS)
+        except (OSError, subprocess.TimeoutExpired):
+            continue
+        if test.returncode == 0:
+            available.append(encoder)
+    return available
+
+def _format_ffmpeg_error(stderr_tail):
+    """Decodes the last 500 characters of FFmpeg's log (already cut to STDERR_TAIL_SIZE bytes)."""
+    return bytes(stderr_tail[-STDERR_TAIL_SIZE:]).decode('utf-8', errors='ignore').strip()[-500:]
+
+# --- SPLITTING WORKER (no GUI access) ---
+
+def _kill_process(proc):
+    """Kills an FFmpeg process, ignoring one that has already exited."""
+    try:
+        proc.kill()
+    except ProcessLookupError:
+        pass
+
+async def _run_ffmpeg(command, ffmpeg_timeout, on_progress, active_processes, stop_event):
+    """Runs FFmpeg, reporting the encoded time (microseconds) as it is written to stderr.
+
+    Returns the exit code, the end of the log (progress lines excluded, at most
+    STDERR_TAIL_SIZE bytes) and the last encoded time in microseconds (None if FFmpeg
+    reported no progress).
+    FFmpeg is killed if the timeout expires (asyncio.TimeoutError) or the task is cancelled,
+    and right away if stop_event was set while it was starting.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, 
+        limit=STDERR_BUFFER_SIZE, **SUBPROCESS_KWARGS
+    )
+    active_processes.add(proc)
+    # The application kills active_processes on exit: this one may have missed it
+    if stop_event.is_set():
+        _kill_process(proc)
+    log_tail = bytearray()
+    out_time_us = None
+
+    async def read_stderr():
+        nonlocal out_time_us
+        while True:
+            line = await proc.stderr.readline()
+            if not line:
+                break
+            match = FFMPEG_PROGRESS_RE.match(line)
+            if match:
+                out_time_us = int(match.group(1))
+                on_progress(out_time_us)
+            elif not FFMPEG_PROGRESS_LINE_RE.match(line):
+                log_tail.extend(line)
+                del log_tail[:-STDERR_TAIL_SIZE]
+        return await proc.wait()
+
+    try:
+        returncode = await asyncio.wait_for(read_stderr(), timeout=ffmpeg_timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        _kill_process(proc)
+        await proc.wait()
+        raise
+    finally:
+        active_processes.discard(proc)
+
+    return returncode, log_tail, out_time_us
+
+async def _encode_range(index, start_us, end_us, input_file, MAX_SIZE, ffmpeg_timeout, ffmpeg_args, temp_base, file_extension, on_progress, active_processes, stop_event, keyframes=None):
+    """Encodes one planned range and returns the files created.
+
+    A range normally fits in one segment. If FFmpeg reaches the size limit first,
+    the next segment resumes from the measured end of the previous one.
+    With stream copy (keyframes given, sorted, in microseconds) a segment can only
+    start on a keyframe: an oversized one is written again up to the last keyframe
+    it reached, and the next segment starts there.
+    Times are integer microseconds, so advancing through the range accumulates no
+    rounding error. on_progress(index, us) receives the time encoded so far in this range;
+    no new FFmpeg process is started once stop_event is set.
+    """
+    range_start_us = start_us
+    piece_end_us = end_us
+    pieces = []
+    k = 1
+
+    while start_us < end_us:
+        output_file = f"{temp_base}{index + 1:02d}-{k:02d}{file_extension}"
+        segment_label = f"{index + 1}" if k == 1 else f"{index + 1}.{k}"
+        if stop_event.is_set():
+            raise RuntimeError("Splitting cancelled.")
+
+        # -ss/-to before -i: input seeking jumps to the nearest keyframe through the
+        # demuxer index instead of decoding from 0. When re-encoding, FFmpeg's default
+        # -accurate_seek still trims the few frames up to the exact start time.
+        command = [
+            FFMPEG_EXE,
+            "-ss", _us_to_timestamp(start_us),
+            "-to", _us_to_timestamp(piece_end_us),
+            "-i", input_file,
+            *ffmpeg_args, 
+            *FFMPEG_PROGRESS_ARGS,
+            "-fs", str(MAX_SIZE),
+            "-map", "0",
+            "-n", # Prevent overwriting
+            output_file
+        ]
+
+        # FFmpeg Execution (progress is streamed while the segment is encoded)
+        offset_us = start_us - range_start_us
+        try:
+            # Use the user-provided timeout
+            returncode, ffmpeg_stderr, duration_us = await _run_ffmpeg(
+                command, ffmpeg_timeout, lambda us: on_progress(index, offset_us + us), active_processes, stop_event
+            )
+        except asyncio.TimeoutError:
+            # Catch specific timeout error and raise a readable error
+            error_message = f"Timeout: Segment {segment_label} processing exceeded the {ffmpeg_timeout/60:.0f} minute limit."
+            raise RuntimeError(error_message)
+        except Exception as e:
+            error_message = f"FFmpeg (Segment {segment_label}) system error: {e.__class__.__name__} - {str(e)}"
+            raise RuntimeError(error_message)
+
+        if returncode != 0:
+            ffmpeg_error_output = _format_ffmpeg_error(ffmpeg_stderr)
+            error_message = f"FFmpeg (Segment {segment_label}) failed. Code: {returncode}. Details: ...{ffmpeg_error_output}"
+            raise RuntimeError(error_message)
+
+        # One stat call for both the integrity check and the exit condition
+        try:
+            actual_size = os.stat(output_file).st_size
+        except FileNotFoundError:
+            actual_size = 0
+        if actual_size < 1024:
+            raise RuntimeError(f"File {output_file} is empty/corrupted. Aborting.")
+
+        pieces.append(output_file)
+
+        # Measure time (last position reported by FFmpeg) and update start point
+        if duration_us is None:
+            raise RuntimeError(f"Could not measure segment {segment_label} duration. FFmpeg reported no progress.")
+        if duration_us == 0: break # End of file
+
+        if actual_size < MAX_SIZE * 0.99:
+            # Exit condition (end of the range based on size)
+            if piece_end_us == end_us:
+                break
+            # Segment cut on a keyframe (stream copy): the next one starts there
+            start_us = piece_end_us
+            piece_end_us = end_us
+        elif keyframes is None:
+            start_us += duration_us
+        else:
+            # Stream copy cannot start mid-GOP: end this segment on the last keyframe
+            # it reached and write it again (the -fs cut point is not a keyframe)
+            keyframe_index = bisect.bisect_right(keyframes, start_us + duration_us) - 1
+            if keyframe_index < 0 or keyframes[keyframe_index] <= start_us:
+                raise RuntimeError(f"Segment {segment_label}: the interval between two keyframes exceeds the max size. Disable Fast mode to re-encode.")
+            piece_end_us = keyframes[keyframe_index]
+            os.remove(pieces.pop())
+            continue
+
+        k += 1
+
+    return pieces
+
+async def _copy_segments(plan, input_file, ffmpeg_timeout, ffmpeg_args, temp_base, file_extension, on_progress, active_processes, stop_event):
+    """Writes all planned segments in one FFmpeg run of the segment muxer (stream copy only).
+
+    The input is read once instead of once per segment. Returns a (start, end, file)
+    tuple (microseconds) for each segment written, as reported in the muxer's segment list.
+    """
+    segment_list = f"{temp_base}list.csv"
+    command = [
+        FFMPEG_EXE,
+        "-i", input_file,
+        *ffmpeg_args,
+        *FFMPEG_PROGRESS_ARGS,
+        "-map", "0",
+        "-f", "segment",
+        # Planned boundaries are keyframes, where stream copy can cut exactly
+        "-segment_times", ",".join(_us_to_timestamp(start_us) for start_us, _ in plan[1:]),
+        "-segment_start_number", "1",
+        "-reset_timestamps", "1",
+        "-segment_list", segment_list,
+        "-segment_list_type", "csv",
+        f"{temp_base.replace('%', '%%')}%02d{file_extension}" # % would be read as a pattern
+    ]
+
+    # The timeout is per segment: the single run gets the timeout of all of them
+    try:
+        returncode, ffmpeg_stderr, _ = await _run_ffmpeg(command, ffmpeg_timeout * len(plan), on_progress, active_processes, stop_event)
+    except asyncio.TimeoutError:
+        raise RuntimeError(f"Timeout: Splitting exceeded the {ffmpeg_timeout * len(plan)/60:.0f} minute limit ({len(plan)} segments).")
+    except Exception as e:
+        raise RuntimeError(f"FFmpeg (single pass) system error: {e.__class__.__name__} - {str(e)}")
+
+    if returncode != 0:
+        ffmpeg_error_output = _format_ffmpeg_error(ffmpeg_stderr)
+        raise RuntimeError(f"FFmpeg (single pass) failed. Code: {returncode}. Details: ...{ffmpeg_error_output}")
+
+    import csv
+    
+    # Segment list lines: file name (relative to the list), start time, end time
+    segments = []
+    with open(segment_list, newline="", encoding="utf-8") as list_file:
+        for name, start, end in csv.reader(list_file):
+            segments.append((_seconds_to_us(start), _seconds_to_us(end), os.path.join(os.path.dirname(segment_list), name)))
+    os.remove(segment_list)
+
+    if not segments:
+        raise RuntimeError("FFmpeg (single pass) did not write any segment. Aborting.")
+    return segments
+
+def _plan_ranges(keyframes, start_us, end_us, segment_us):
+    """Splits start_us..end_us into (start, end) ranges of about segment_us, cut on keyframes (all in microseconds)."""
+    boundaries = [start_us]
+    target = start_us + segment_us
+    while target < end_us:
+        # Cut on the last keyframe before the target: snapping forward would
+        # make the range larger than the size estimate.
+        index = bisect.bisect_right(keyframes, target) - 1
+        if index >= 0 and keyframes[index] > boundaries[-1]:
+            cut = keyframes[index]
+        else:
+            cut = target
+        boundaries.append(cut)
+        target = cut + segment_us
+
+    return list(zip(boundaries, boundaries[1:] + [end_us]))
+
+async def _merge_pieces(pieces, MAX_SIZE, ffmpeg_timeout, temp_base, file_extension, active_processes, stop_event):
+    """Joins consecutive files whose total size fits in MAX_SIZE (concat demuxer, stream copy).
+
+    Ranges are planned from an estimated bitrate, so files can come out well under
+    the max size: joining them gives the fewest files. Returns the resulting files in order.
+    """
+    groups = []
+    group_size = 0
+    for piece in pieces:
+        size = os.stat(piece).st_size
+        if groups and group_size + size <= MAX_SIZE:
+            groups[-1].append(piece)
+            group_size += size
+        else:
+            groups.append([piece])
+            group_size = size
+
+    merged = []
+    for n, group in enumerate(groups, start=1):
+        if len(group) == 1:
+            merged.append(group[0])
+            continue
+        if stop_event.is_set():
+            raise RuntimeError("Splitting cancelled.")
+
+        concat_list = f"{temp_base}concat.txt"
+        output_file = f"{temp_base}{n:02d}-joined{file_extension}"
+        with open(concat_list, "w", encoding="utf-8") as list_file:
+            for piece in group:
+                # Concat demuxer syntax: single-quoted path, ' written as '\''
+                escaped = piece.replace("'", "'\\''")
+                list_file.write(f"file '{escaped}'\n")
+        command = [
+            FFMPEG_EXE,
+            "-f", "concat", "-safe", "0",
+            "-i", concat_list,
+            "-c", "copy",
+            *FFMPEG_PROGRESS_ARGS,
+            "-map", "0",
+            "-n", # Prevent overwriting
+            output_file
+        ]
+        try:
+            returncode, _, _ = await _run_ffmpeg(command, ffmpeg_timeout, lambda us: None, active_processes, stop_event)
+        except asyncio.TimeoutError:
+            returncode = None
+        finally:
+            os.remove(concat_list)
+
+        # Joining only saves files: if it fails or overshoots, the files are kept as they are
+        try:
+            joined_size = os.stat(output_file).st_size
+        except FileNotFoundError:
+            joined_size = None
+        if returncode == 0 and joined_size is not None and joined_size <= MAX_SIZE:
+            for piece in group:
+                os.remove(piece)
+            merged.append(output_file)
+        else:
+            if joined_size is not None:
+                os.remove(output_file)
+            merged.extend(group)
+    return merged
+
+def _remove_temp_files(temp_base):
+    """Deletes the temporary files of a split: segments ({temp_base}NN...), the segment and concat lists."""
+    directory, prefix = os.path.split(temp_base)
+    with os.scandir(directory or ".") as entries:
+        for entry in entries:
+            tail = entry.name[len(prefix):]
+            if entry.name.startswith(prefix) and (tail[:2].isdecimal() or tail in ("list.csv", "concat.txt")):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+async def split_worker(input_file, MAX_SIZE, ffmpeg_timeout, batch_prefix, segment_plan, total_us, 
+                       ffmpeg_args, max_processes, stream_copy, progress_queue, active_processes, stop_event,
+                       keyframes=None):
+    """Writes the planned segments and returns the number of files created.
+
+    Takes only plain values (no GUI access); segment_plan and total_us are in integer
+    microseconds. Progress is reported through progress_queue
+    as ("progress", fraction) and ("status", text) messages. Running FFmpeg processes
+    are kept in active_processes so the application can kill them on exit, and
+    setting stop_event (a threading.Event) prevents any further FFmpeg run.
+    keyframes (sorted, in microseconds) place the cuts of re-planned ranges and, with
+    stream_copy, of oversized segments.
+    """
+    filename_base, file_extension = os.path.splitext(input_file)
+    temp_base = f"{filename_base}{batch_prefix}_tmp"
+    plan = segment_plan
+    pieces = [None] * len(plan)
+    range_progress = [0] * len(plan)
+
+    def on_progress(index, us):
+        # Overall progress is the encoded time of all ranges
+        range_progress[index] = us
+        progress_queue.put(("progress", min(1.0, sum(range_progress) / total_us)))
+
+    try:
+        # 1. Stream copy: write all segments in a single pass, then check their size
+        to_encode = list(range(len(plan)))
+        if stream_copy and len(plan) > 1 and not stop_event.is_set():
+            progress_queue.put(("status", f"Copying {len(plan)} segments in a single pass..."))
+            segments = await _copy_segments(
+                plan, input_file, ffmpeg_timeout, ffmpeg_args, temp_base, file_extension,
+                lambda us: progress_queue.put(("progress", min(1.0, us / total_us))),
+                active_processes, stop_event
+            )
+            plan = [(start, end) for start, end, _ in segments]
+            pieces = [[segment_file] for _, _, segment_file in segments]
+            range_progress = [end - start for start, end in plan]
+        
+            # Segments above the size limit are written again with the -fs loop below
+            to_encode = [index for index, (_, _, segment_file) in enumerate(segments) 
+                         if os.stat(segment_file).st_size > MAX_SIZE]
+            for index in to_encode:
+                os.remove(pieces[index][0])
+                range_progress[index] = 0
+
+        # 2. Encode the (remaining) ranges in parallel
+        completed = len(plan) - len(to_encode)
+        if to_encode:
+            progress_queue.put(("status", f"Processing {len(to_encode)} segments ({min(max_processes, len(to_encode))} at a time)..."))
+
+        # Re-encoded output rarely has the source bitrate: each time a range is done, the
+        # ranges not started yet are planned again from the measured output bitrate
+        replan = not stream_copy and keyframes is not None
+        encoded_bytes = encoded_us = 0
+
+        # One task per range on this loop, at most max_processes at a time
+        waiting = list(to_encode)
+        tasks = {}
+        try:
+            while waiting or tasks:
+                while waiting and len(tasks) < max_processes:
+                    index = waiting.pop(0)
+                    tasks[asyncio.create_task(_encode_range(
+                        index, plan[index][0], plan[index][1], input_file, MAX_SIZE, ffmpeg_timeout, ffmpeg_args,
+                        temp_base, file_extension, on_progress, active_processes, stop_event,
+                        keyframes if stream_copy else None
+                    ))] = index
+                done, _ = await asyncio.wait(set(tasks), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index = tasks.pop(task)
+                    pieces[index] = task.result()
+                    start, end = plan[index]
+                    completed += 1
+                    on_progress(index, end - start)
+                    if replan:
+                        encoded_bytes += sum(os.stat(piece).st_size for piece in pieces[index])
+                        encoded_us += end - start
+                if replan and waiting and encoded_bytes:
+                    # Waiting ranges are always the end of the plan
+                    first = waiting[0]
+                    segment_us = max(int(MAX_SIZE * PLAN_SIZE_MARGIN * encoded_us / encoded_bytes), 1_000_000)
+                    plan = plan[:first] + _plan_ranges(keyframes, plan[first][0], total_us, segment_us)
+                    pieces[first:] = [None] * (len(plan) - first)
+                    range_progress[first:] = [0] * (len(plan) - first)
+                    waiting = list(range(first, len(plan)))
+                progress_queue.put(("status", f"Processing segments: {completed}/{len(plan)} done"))
+        except BaseException:
+            # After a failure, cancel the other ranges (their FFmpeg processes are killed)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        # 3. Join consecutive files that fit together in the max size
+        all_pieces = list(itertools.chain.from_iterable(pieces))
+        if len(all_pieces) > 1:
+            progress_queue.put(("status", "Joining segments below the max size..."))
+            all_pieces = await _merge_pieces(all_pieces, MAX_SIZE, ffmpeg_timeout, temp_base, file_extension, active_processes, stop_event)
+    except BaseException:
+        # Failed or cancelled split: no temporary file is left behind, so the
+        # next run does not collide with them (FFmpeg runs with -n)
+        _remove_temp_files(temp_base)
+        raise
+
+    # 4. Number the segments in playback order
+    segments_created = 0
+    for i, piece in enumerate(all_pieces, start=1):
+        os.rename(piece, f"{filename_base}{batch_prefix}_part{i:02d}{file_extension}")
+        segments_created += 1
+    return segments_created
+
 # --- MODAL INFO/ERROR POPUP CLASS ---
 
 class InfoToplevel(ctk.CTkToplevel):
@@ -58,7 +554,7 @@ class InfoToplevel(ctk.CTkToplevel):
         super().__init__(master)
         
         INFO_WIDTH = 500
-        INFO_HEIGHT = 450  # Increased height to accommodate all text and the Close button
+        INFO_HEIGHT = 520  # Increased height to accommodate all text and the Close button
         self.title(title)
         
         # Center the popup window
@@ -97,7 +593,7 @@ class VideoSplitterApp(ctk.CTk):
 
         # Window Configuration
         self.title("FFmpeg Video Splitter for NotebookLM")
-        self._set_geometry_center(600, 630) 
+        self._set_geometry_center(600, 760) 
         ctk.set_appearance_mode("System")  
         ctk.set_default_color_theme("blue")
         
@@ -105,13 +601,29 @@ class VideoSplitterApp(ctk.CTk):
         self.input_file = ctk.StringVar()
         self.max_size_mb = ctk.StringVar(value="200") 
         self.timeout_minutes = ctk.StringVar(value="60") # Default timeout 60 minutes
+        self.fast_mode = ctk.BooleanVar(value=False) # Stream copy, enabled when the codecs allow it
+        self.preset_var = ctk.StringVar(value=X264_PRESET_DEFAULT)
+        self.crf_var = ctk.StringVar(value=X264_CRF_DEFAULT)
+        self.encoder_var = ctk.StringVar(value=SW_ENCODER)
         self.current_thread = None
+        self._active_processes = set() # Running FFmpeg processes (killed on exit, from their loop)
+        self._split_loop = None # asyncio loop of the running split
+        self._stop_event = threading.Event() # Set on exit: the split starts no more FFmpeg runs
+        self._gui_queue = queue.Queue() # Background threads -> GUI messages (see _drain_gui_queue)
+        self._info_cache = {} # (path, mtime, size) -> parsed ffprobe JSON
+        self._keyframes = {} # (path, mtime, size) -> sorted keyframe times (microseconds)
         self.info_window = None 
         self.batch_prefix = "" 
         
         # Initialize UI
         self._setup_ui()
         
+        # Look for hardware encoders without delaying the window
+        threading.Thread(target=self._detect_encoders_task, daemon=True).start()
+        
+        # Apply the background threads' GUI messages
+        self._gui_queue_job = self.after(GUI_QUEUE_INTERVAL_MS, self._drain_gui_queue)
+        
         # Handle clean exit
         self.protocol("WM_DELETE_WINDOW", self._on_closing)
 
@@ -127,10 +639,24 @@ class VideoSplitterApp(ctk.CTk):
         """Called when the user attempts to close the window."""
         if self.current_thread and self.current_thread.is_alive():
             print("Warning: Interrupting splitting thread.")
+            self._stop_event.set()
+            # The processes belong to the split's loop (and thread): kill them there
+            split_loop = self._split_loop
+            if split_loop is not None:
+                try:
+                    split_loop.call_soon_threadsafe(self._kill_active_processes)
+                except RuntimeError:
+                    pass # Loop already closed
+        self.after_cancel(self._gui_queue_job)
         self.quit()
         self.destroy()
         sys.exit(0)
         
+    def _kill_active_processes(self):
+        """Kills the running FFmpeg processes (runs on the split's asyncio loop)."""
+        for proc in list(self._active_processes):
+            _kill_process(proc)
+
     def _show_info(self):
         """Displays the application information window (modal)."""
         info_text = (
@@ -140,8 +666,18 @@ class VideoSplitterApp(ctk.CTk):
             f"Default Max Size: {MAX_SIZE_DEFAULT_BYTES / (1024*1024):.0f} MB.\n\n"
             "**HOW IT WORKS:**\n"
             "1. Maximum size is enforced by FFmpeg through video re-encoding (which is CPU-intensive).\n"
-            "2. After each segment, the script measures the actual duration and resumes the next segment from that precise point.\n"
-            "3. Overwriting existing files is prevented using an automatic batch suffix (e.g., `_v01`).\n\n"
+            "2. Segments are planned from the average bitrate, cut on keyframes and encoded in parallel on all CPU cores.\n"
+            "   Each segment is reached by seeking directly in the input, so nothing before it is decoded again.\n"
+            "   If a segment reaches the max size early, the script measures its actual duration and resumes from that precise point.\n"
+            "   The remaining segments are then planned from the bitrate measured on the finished ones, and consecutive files\n"
+            "   that fit together in the max size are joined (without re-encoding). The first segments, encoded before any\n"
+            "   measurement, can still produce a small extra file.\n"
+            "3. When re-encoding, the x264 preset trades speed for compression (faster presets give larger files, so more segments) "
+            "and the CRF sets the quality (lower is better and larger).\n"
+            "   Hardware encoders (NVIDIA NVENC, Intel QuickSync, AMD AMF) are listed when available: much faster, with larger files.\n"
+            "4. Fast mode (stream copy) skips re-encoding when the video is already H.264/HEVC/AV1 with AAC/MP3/Opus audio.\n"
+            "   All segments are then written in a single pass; any segment above the max size is split again.\n"
+            "5. Overwriting existing files is prevented using an automatic batch suffix (e.g., `_v01`).\n\n"
             "**PROCESSING TIMEOUT:**\n"
             "The timeout sets the maximum time (in minutes) FFmpeg is allowed to spend processing each individual segment.\n\n"
             "**ESSENTIAL REQUIREMENTS:**\n"
@@ -164,7 +700,7 @@ class VideoSplitterApp(ctk.CTk):
     def _setup_ui(self):
         # Grid Configuration
         self.grid_columnconfigure(0, weight=1)
-        self.grid_rowconfigure(8, weight=1)
+        self.grid_rowconfigure(9, weight=1)
 
         # 1. Header (Title and Info Button)
         header_frame = ctk.CTkFrame(self, fg_color="transparent")
@@ -214,27 +750,57 @@ class VideoSplitterApp(ctk.CTk):
         self.timeout_entry = ctk.CTkEntry(timeout_frame, textvariable=self.timeout_minutes, width=100)
         self.timeout_entry.grid(row=0, column=1, padx=10, pady=5, sticky="e")
 
-        # 5. START Button
+        # 5. Encoding Mode
+        options_frame = ctk.CTkFrame(self)
+        options_frame.grid(row=4, column=0, padx=20, pady=(5, 10), sticky="ew")
+        options_frame.columnconfigure((0, 2), weight=1)
+        
+        self.fast_checkbox = ctk.CTkCheckBox(options_frame, text="Fast (stream copy, no re-encoding)", 
+                                             variable=self.fast_mode, state="disabled",
+                                             command=self._update_encoding_options)
+        self.fast_checkbox.grid(row=0, column=0, columnspan=4, padx=10, pady=5, sticky="w")
+        
+        preset_label = ctk.CTkLabel(options_frame, text="Preset:")
+        preset_label.grid(row=1, column=0, padx=10, pady=5, sticky="w")
+        
+        self.preset_menu = ctk.CTkOptionMenu(options_frame, variable=self.preset_var, values=list(X264_PRESETS), width=120)
+        self.preset_menu.grid(row=1, column=1, padx=10, pady=5, sticky="e")
+        
+        crf_label = ctk.CTkLabel(options_frame, text="Quality (CRF):")
+        crf_label.grid(row=1, column=2, padx=10, pady=5, sticky="w")
+        
+        self.crf_menu = ctk.CTkOptionMenu(options_frame, variable=self.crf_var, values=list(X264_CRF_VALUES), width=80)
+        self.crf_menu.grid(row=1, column=3, padx=10, pady=5, sticky="e")
+        
+        encoder_label = ctk.CTkLabel(options_frame, text="Encoder:")
+        encoder_label.grid(row=2, column=0, padx=10, pady=5, sticky="w")
+        
+        self.encoder_combobox = ctk.CTkComboBox(options_frame, variable=self.encoder_var, values=[SW_ENCODER], 
+                                                width=120, state="readonly",
+                                                command=lambda _: self._update_encoding_options())
+        self.encoder_combobox.grid(row=2, column=1, padx=10, pady=5, sticky="e")
+
+        # 6. START Button
         self.start_button = ctk.CTkButton(self, text="START SPLITTING", command=self._start_splitting, 
                                           font=ctk.CTkFont(size=16, weight="bold"), height=40)
-        self.start_button.grid(row=4, column=0, padx=20, pady=(20, 10), sticky="ew")
+        self.start_button.grid(row=5, column=0, padx=20, pady=(20, 10), sticky="ew")
 
-        # 6. Summary Label (Permanent)
+        # 7. Summary Label (Permanent)
         self.summary_label = ctk.CTkLabel(self, text="File details...", justify="left", height=60, anchor="nw")
-        self.summary_label.grid(row=5, column=0, padx=20, pady=(10, 0), sticky="ew")
+        self.summary_label.grid(row=6, column=0, padx=20, pady=(10, 0), sticky="ew")
         
-        # 7. Progress and Status Label
+        # 8. Progress and Status Label
         self.progress_label = ctk.CTkLabel(self, text="Waiting...", justify="left")
-        self.progress_label.grid(row=6, column=0, padx=20, pady=(5, 5), sticky="w")
+        self.progress_label.grid(row=7, column=0, padx=20, pady=(5, 5), sticky="w")
 
-        # 8. Progress Bar
+        # 9. Progress Bar
         self.progressbar = ctk.CTkProgressBar(self, mode="determinate")
-        self.progressbar.grid(row=7, column=0, padx=20, pady=(0, 20), sticky="ew")
+        self.progressbar.grid(row=8, column=0, padx=20, pady=(0, 20), sticky="ew")
         self.progressbar.set(0) 
 
-        # 9. Bottom Controls (Exit)
+        # 10. Bottom Controls (Exit)
         bottom_controls_frame = ctk.CTkFrame(self, fg_color="transparent")
-        bottom_controls_frame.grid(row=8, column=0, padx=20, pady=(10, 20), sticky="se")
+        bottom_controls_frame.grid(row=9, column=0, padx=20, pady=(10, 20), sticky="se")
         
         self.exit_button = ctk.CTkButton(bottom_controls_frame, text="Exit", width=100, command=self._on_closing)
         self.exit_button.pack(side="right")
@@ -249,6 +815,8 @@ class VideoSplitterApp(ctk.CTk):
         )
         if file_path:
             self.input_file.set(file_path)
+            self._info_cache.clear()
+            self._keyframes.clear()
             self._reset_ui()
             self._update_summary_info(file_path)
 
@@ -260,6 +828,23 @@ class VideoSplitterApp(ctk.CTk):
         self.progressbar.stop()
         self.start_button.configure(state="normal", text="START SPLITTING")
         self.exit_button.configure(state="normal")
+        self.fast_mode.set(False)
+        self.fast_checkbox.configure(state="disabled")
+        self._update_encoding_options()
+
+    def _update_encoding_options(self):
+        """Enables the re-encoding options only when fast mode (stream copy) is off."""
+        fast = self.fast_mode.get()
+        # The preset list is specific to libx264
+        self.preset_menu.configure(state="normal" if not fast and self.encoder_var.get() == SW_ENCODER else "disabled")
+        self.crf_menu.configure(state="disabled" if fast else "normal")
+        self.encoder_combobox.configure(state="disabled" if fast else "readonly")
+
+    def _detect_encoders_task(self):
+        """Adds the usable hardware encoders to the Encoder list (background thread)."""
+        hw_encoders = _detect_hw_encoders()
+        if hw_encoders:
+            self._gui_queue.put(("encoders", [SW_ENCODER, *hw_encoders]))
         
     # --- FFPROBE/FFMPEG METHODS ---
     
@@ -271,7 +856,8 @@ class VideoSplitterApp(ctk.CTk):
                 capture_output=True, 
                 text=True, 
                 check=True,
-                timeout=timeout
+                timeout=timeout,
+                **SUBPROCESS_KWARGS
             )
             return result.stdout.strip()
         except FileNotFoundError:
@@ -281,25 +867,82 @@ class VideoSplitterApp(ctk.CTk):
         except subprocess.CalledProcessError as e:
             raise RuntimeError(f"FFprobe Error ({e.returncode}): Analysis failed. Details: {e.stderr.strip()[:500]}")
 
+    def _probe_file(self, input_file):
+        """Runs ffprobe once for all format and stream metadata (cached until the file changes)."""
+        st = os.stat(input_file)
+        cache_key = (input_file, st.st_mtime_ns, st.st_size)
+        if cache_key not in self._info_cache:
+            # Use a short timeout for file analysis (15 seconds)
+            probe_str = self._execute_ffprobe([
+                FFPROBE_EXE, "-v", "error", "-of", "json", "-show_entries",
+                "format=duration,size,bit_rate,start_time:stream=codec_type,codec_name,width,height,r_frame_rate",
+                input_file
+            ])
+            import json
+            probe = json.loads(probe_str)
+            probe.setdefault("format", {}).setdefault("size", str(st.st_size))
+            self._info_cache[cache_key] = probe
+        return self._info_cache[cache_key]
+
     def _get_file_info(self, input_file):
-        """Gets duration, size, and bitrate of the file."""
-        duration = 0
+        """Gets duration (integer microseconds), size, and bitrate of the file."""
+        duration_us = 0
         file_size = None
         bitrate = None
         
-        # Use a short timeout for file analysis (15 seconds)
-        duration_str = self._execute_ffprobe([
-            FFPROBE_EXE, "-v", "error", "-show_entries", "format=duration", 
-            "-of", "default=noprint_wrappers=1:nokey=1", input_file
-        ])
+        file_format = self._probe_file(input_file)["format"]
+        
+        duration_us = _seconds_to_us(file_format["duration"])
+        file_size = int(file_format["size"])
         
-        duration = math.ceil(float(duration_str))
-        file_size = os.path.getsize(input_file)
+        if str(file_format.get("bit_rate", "")).isdigit():
+            bitrate = int(file_format["bit_rate"]) / 1000 # Kbps
+        elif duration_us > 0 and file_size > 0:
+            bitrate = (file_size * 8000) / duration_us # Kbps
+
+        return duration_us, file_size, bitrate
+
+    def _get_streams(self, input_file):
+        """Gets the ffprobe entries of the first video and audio streams ({} if missing)."""
+        video_stream = {}
+        audio_stream = {}
         
-        if duration > 0 and file_size > 0:
-            bitrate = (file_size * 8) / duration / 1000 # Kbps
+        for stream in self._probe_file(input_file).get("streams", []):
+            if stream.get("codec_type") == "video" and not video_stream:
+                video_stream = stream
+            elif stream.get("codec_type") == "audio" and not audio_stream:
+                audio_stream = stream
 
-        return duration, file_size, bitrate
+        return video_stream, audio_stream
+
+    def _probe_keyframes(self, input_file, timeout=15):
+        """Gets the sorted keyframe times (microseconds) of the first video stream (cached until the file changes)."""
+        st = os.stat(input_file)
+        cache_key = (input_file, st.st_mtime_ns, st.st_size)
+        if cache_key not in self._keyframes:
+            # Packet flags come from the demuxer: no frame is decoded
+            packets_str = self._execute_ffprobe([
+                FFPROBE_EXE, "-v", "error", "-select_streams", "v:0",
+                "-show_entries", "packet=pts_time,flags", "-of", "csv=print_section=0", input_file
+            ], timeout=timeout)
+            # Packet times are stream timestamps; -ss/-to and -segment_times count from
+            # the file's start time (non-zero e.g. in MPEG-TS or with MP4 edit lists)
+            try:
+                start_us = _seconds_to_us(self._probe_file(input_file)["format"].get("start_time", 0))
+            except ValueError:
+                start_us = 0 # start_time=N/A
+            keyframes = []
+            for line in packets_str.splitlines():
+                pts_time, _, flags = line.strip().partition(",")
+                if "K" not in flags:
+                    continue
+                try:
+                    keyframes.append(_seconds_to_us(pts_time) - start_us)
+                except ValueError:
+                    pass # pts_time=N/A
+            keyframes.sort()
+            self._keyframes[cache_key] = keyframes
+        return self._keyframes[cache_key]
             
     def _update_summary_info(self, input_file):
         """Updates the summary label after file selection."""
@@ -309,22 +952,32 @@ class VideoSplitterApp(ctk.CTk):
             self.progressbar.start()
             self.progress_label.configure(text="Calculating file info...", text_color="white")
 
-            total_duration, size_bytes, bitrate_kbps = self._get_file_info(input_file)
+            total_us, size_bytes, bitrate_kbps = self._get_file_info(input_file)
+            video_stream, audio_stream = self._get_streams(input_file)
+            video_codec = video_stream.get("codec_name")
+            audio_codec = audio_stream.get("codec_name")
             
             self.progressbar.stop()
             self.progressbar.configure(mode="determinate")
             
             size_human = _format_bytes(size_bytes)
             bitrate_human = f"{bitrate_kbps:.0f} Kbps" if bitrate_kbps else "N/A"
-            duration_human = _format_seconds(total_duration)
+            duration_human = _format_seconds(total_us // 1_000_000)
             
             self.summary_label.configure(
                 text=(
                     f"Total Duration: {duration_human}\n"
-                    f"Original Size: {size_human} ({bitrate_human})"
+                    f"Original Size: {size_human} ({bitrate_human})\n"
+                    f"Codecs: {video_codec or 'none'} ({video_stream.get('width', '?')}x{video_stream.get('height', '?')}) / {audio_codec or 'none'}"
                 ),
                 text_color="white"
             )
+            
+            # Stream copy is only offered when the codecs can be kept as they are
+            fast_supported = video_codec in FAST_VIDEO_CODECS and (audio_codec is None or audio_codec in FAST_AUDIO_CODECS)
+            self.fast_mode.set(fast_supported)
+            self.fast_checkbox.configure(state="normal" if fast_supported else "disabled")
+            self._update_encoding_options()
             self.progress_label.configure(text="Ready for splitting.", text_color="white")
             
         except Exception as e:
@@ -338,18 +991,29 @@ class VideoSplitterApp(ctk.CTk):
         """Finds the next unused batch prefix (e.g., _v01, _v02)."""
         max_version = 0
         
-        # Regex to find files with pattern *_{number}_partXX
-        # Search for all files in the output directory
-        
-        pattern = re.compile(rf'^{re.escape(os.path.basename(filename_base))}_v(\d+)_part\d{{2}}{re.escape(os.path.splitext(self.input_file.get())[1])}$')
+        # Files with pattern {base}_v{number}_partXX{ext}, or the temporary files
+        # {base}_v{number}_tmp... of an interrupted split, matched with plain
+        # string checks: most directory entries fail the startswith test
+        version_prefix = os.path.basename(filename_base) + "_v"
+        file_extension = os.path.splitext(self.input_file.get())[1]
         
         try:
-            for item in os.listdir(output_directory):
-                match = pattern.match(item)
-                if match:
-                    version = int(match.group(1))
-                    if version > max_version:
-                        max_version = version
+            # scandir iterates lazily: the directory listing is never built in memory
+            with os.scandir(output_directory) as entries:
+                for entry in entries:
+                    item = entry.name
+                    if not item.startswith(version_prefix):
+                        continue
+                    version_str, separator, name_tail = item[len(version_prefix):].partition("_")
+                    if not separator or not version_str.isdecimal():
+                        continue
+                    part_str = name_tail[len("part"):len(name_tail) - len(file_extension)]
+                    is_part = (name_tail.startswith("part") and name_tail.endswith(file_extension)
+                               and len(part_str) == 2 and part_str.isdecimal())
+                    if is_part or name_tail.startswith("tmp"):
+                        version = int(version_str)
+                        if version > max_version:
+                            max_version = version
         except FileNotFoundError:
             # Output folder does not exist (unlikely here), use v01
             pass
@@ -386,109 +1050,148 @@ class VideoSplitterApp(ctk.CTk):
             self._update_gui(f"❌ Error: Enter a valid Timeout (Minutes) (> 0).", final_error=True)
             return
 
-        # Start processing on a separate thread
+        # Stream copy or H.264 re-encoding
+        if self.fast_mode.get():
+            ffmpeg_args = FFMPEG_ARGS_FAST
+            max_processes = FFMPEG_MAX_PROCESSES
+        else:
+            ffmpeg_args = self._build_ffmpeg_args()
+            max_processes = FFMPEG_MAX_PROCESSES if self.encoder_var.get() == SW_ENCODER else HW_ENCODER_MAX_PROCESSES
+
+        # Start processing on a separate thread running the asyncio loop
         self.current_thread = threading.Thread(
-            target=self._splitting_thread_task, 
-            args=(input_file, max_size_mb, ffmpeg_timeout)
+            target=asyncio.run, 
+            args=(self._splitting_coro(input_file, max_size_mb, ffmpeg_timeout, ffmpeg_args, max_processes, self.fast_mode.get()),)
         )
         self.current_thread.start()
 
-    def _splitting_thread_task(self, input_file, max_size_mb, ffmpeg_timeout):
-        """Contains all splitting logic to be run in the background thread."""
+    def _drain_gui_queue(self):
+        """Applies the queued GUI messages (main thread), then reschedules itself."""
+        progress_value = None
+        status_text = None
+        popups = []
+        
+        def flush():
+            # Only the latest progress/status is shown, before any later message
+            nonlocal progress_value, status_text
+            if progress_value is not None:
+                self.progressbar.set(progress_value)
+            if status_text is not None:
+                self.progress_label.configure(text=status_text, text_color="white")
+            progress_value = status_text = None
+        
+        for _ in range(GUI_QUEUE_BATCH):
+            try:
+                kind, value = self._gui_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                progress_value = value
+            elif kind == "status":
+                status_text = value
+            else:
+                flush()
+                if kind == "update":
+                    self._apply_gui_update(**value)
+                elif kind == "popup":
+                    popups.append(value)
+                elif kind == "start_time":
+                    self.summary_label.configure(text=f"Start Time: {value} | {self.summary_label.cget('text')}")
+                elif kind == "encoders":
+                    self.encoder_combobox.configure(values=value)
+                elif kind == "done":
+                    self.start_button.configure(state="normal", text="START SPLITTING")
+                    self.exit_button.configure(state="normal")
+                    self.progressbar.stop()
+        flush()
+        
+        self._gui_queue_job = self.after(GUI_QUEUE_INTERVAL_MS, self._drain_gui_queue)
+        # Modal popups wait in a nested event loop, so they are shown last,
+        # once the next drain is already scheduled
+        for message, success in popups:
+            self._show_error_popup(message, success=success)
+
+    def _build_ffmpeg_args(self):
+        """Builds the H.264/AAC re-encoding parameters from the encoder, preset and CRF selected in the GUI."""
+        encoder = self.encoder_var.get()
+        quality = self.crf_var.get()
+        audio_args = ["-c:a", "aac", "-b:a", "128k"]
         
-        segments_created = 0
-        i = 1 # Current segment counter
+        if encoder == "h264_nvenc":
+            return ["-c:v", "h264_nvenc", "-preset", "p5", "-rc", "vbr", "-cq", quality, "-b:v", "0", *audio_args]
+        if encoder == "h264_qsv":
+            return ["-c:v", "h264_qsv", "-preset", "medium", "-global_quality", quality, *audio_args]
+        if encoder == "h264_amf":
+            return ["-c:v", "h264_amf", "-quality", "balanced", "-rc", "cqp", "-qp_i", quality, "-qp_p", quality, *audio_args]
+
+        # A single FFmpeg process uses all cores (0 = auto); parallel processes are capped
+        threads = "0" if FFMPEG_MAX_PROCESSES == 1 else str(FFMPEG_THREADS_PER_PROCESS)
+        return [
+            "-c:v", SW_ENCODER, 
+            "-crf", quality, 
+            "-preset", self.preset_var.get(),
+            "-threads", threads,
+            "-x264-params", f"threads={threads}:lookahead_threads=2:sliced_threads=0",
+            *audio_args
+        ]
+
+    def _plan_segments(self, input_file, total_us, MAX_SIZE, bitrate, timeout):
+        """Splits the file into (start, end) ranges (microseconds) expected to fit in MAX_SIZE, cut on keyframes."""
+        if not bitrate:
+            return [(0, total_us)]
+
+        # Duration that fits in MAX_SIZE at the average bitrate (Kbps) of the file.
+        # At least one second: a tiny max size must not plan endless empty ranges
+        # (the size limit is still enforced by FFmpeg's -fs).
+        segment_us = max(int(MAX_SIZE * 8000 * PLAN_SIZE_MARGIN / bitrate), 1_000_000)
+
+        keyframes = self._probe_keyframes(input_file, timeout=timeout)
+        return _plan_ranges(keyframes, 0, total_us, segment_us)
+
+    async def _splitting_coro(self, input_file, max_size_mb, ffmpeg_timeout, ffmpeg_args, max_processes, stream_copy):
+        """Prepares and runs the split (split_worker), run by a single asyncio loop in the background thread."""
         
+        self._split_loop = asyncio.get_running_loop()
         try:
             # 1. Calculate Total Duration
-            total_duration, _, _ = self._get_file_info(input_file)
-            if total_duration == 0: return 
+            total_us, _, bitrate_kbps = self._get_file_info(input_file)
+            if total_us == 0: return 
 
             MAX_SIZE = int(max_size_mb * 1024 * 1024)
+            from datetime import datetime
             start_time_dt = datetime.now()
             start_time_str = start_time_dt.strftime("%H:%M:%S")
 
             # Update Summary with start time
-            self.after(0, lambda: self.summary_label.configure(text=f"Start Time: {start_time_str} | {self.summary_label.cget('text')}"))
+            self._gui_queue.put(("start_time", start_time_str))
             
             # Initialize loop variables
             filename_base, file_extension = os.path.splitext(input_file)
             output_directory = os.path.dirname(os.path.abspath(input_file))
-            start_time = 0
             
             # --- FIND UNIQUE BATCH PREFIX ---
             batch_prefix = self._find_unique_batch_prefix(filename_base, output_directory)
             # ----------------------------------------
 
-            while start_time < total_duration:
-                # Use batch prefix for file naming
-                output_file = f"{filename_base}{batch_prefix}_part{i:02d}{file_extension}"
-                
-                # Segment status message
-                formatted_start_time = _format_seconds(start_time)
-                self._update_gui(f"Processing Segment {i}: Start {formatted_start_time}", mode="indeterminate")
-
-                command = [
-                    FFMPEG_EXE,
-                    "-i", input_file,
-                    "-ss", str(start_time),
-                    *FFMPEG_ARGS, 
-                    "-fs", str(MAX_SIZE),
-                    "-map", "0",
-                    "-n", # Prevent overwriting
-                    output_file
-                ]
-                
-                # FFmpeg Execution
-                ffmpeg_error_output = None 
-                try:
-                    # Use the user-provided timeout
-                    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=ffmpeg_timeout)
-                except subprocess.TimeoutExpired as e:
-                    # Catch specific timeout error and raise a readable error
-                    error_message = f"Timeout: Segment {i} processing exceeded the {ffmpeg_timeout/60:.0f} minute limit."
-                    raise RuntimeError(error_message)
-                except subprocess.CalledProcessError as e:
-                    ffmpeg_error_output = e.stderr.decode('utf-8', errors='ignore').strip()
-                    error_message = f"FFmpeg (Segment {i}) failed. Code: {e.returncode}. Details: {ffmpeg_error_output[:500]}..."
-                    raise RuntimeError(error_message)
-                except Exception as e:
-                    error_message = f"FFmpeg (Segment {i}) system error: {e.__class__.__name__} - {str(e)}"
-                    raise RuntimeError(error_message)
-
-                
-                # Integrity checks and advancement
-                self.after(0, lambda: self.progressbar.stop() and self.progressbar.configure(mode="determinate"))
-
-                if not os.path.exists(output_file) or os.path.getsize(output_file) < 1024:
-                    raise RuntimeError(f"File {output_file} is empty/corrupted. Aborting.")
-                
-                segments_created += 1 # SEGMENT SUCCESSFULLY CREATED
-                
-                # Measure time and update start point
-                duration_seconds, error = self._get_duration(output_file)
-                if duration_seconds == 0 and error:
-                    raise RuntimeError(f"Could not measure segment {i} duration. {error}")
-                if duration_seconds == 0: break # End of file
-                    
-                start_time += duration_seconds
-                
-                # Update progress bar
-                progress_value = min(1.0, start_time / total_duration)
-                self._update_gui(progress_value=progress_value)
-                
-                # Exit condition (end of the original file based on size)
-                actual_size = os.path.getsize(output_file)
-                if actual_size < MAX_SIZE * 0.99:
-                    break
-                
-                i += 1
+            # 2. Plan keyframe-aligned ranges
+            self._update_gui("Planning segments (keyframe analysis)...", mode="indeterminate")
+            plan = self._plan_segments(input_file, total_us, MAX_SIZE, bitrate_kbps, ffmpeg_timeout)
+            if self._stop_event.is_set():
+                return # Window closed while planning
+
+            # 3. Write the segments (progress arrives through the queue, see _drain_gui_queue)
+            self._update_gui(progress_value=0, mode="determinate")
+            segments_created = await split_worker(
+                input_file, MAX_SIZE, ffmpeg_timeout, batch_prefix, plan, total_us,
+                ffmpeg_args, max_processes, stream_copy, self._gui_queue, self._active_processes, self._stop_event,
+                self._probe_keyframes(input_file, timeout=ffmpeg_timeout)
+            )
             
             # Final success message
             final_message = f"✅ Splitting complete! Created {segments_created} segments. Prefix: {batch_prefix}\nFiles saved in: {output_directory}"
             
             # Show Success Popup
-            self.after(0, lambda: self._show_error_popup(final_message, success=True)) # Use the error popup structure for success
+            self._gui_queue.put(("popup", (final_message, True))) # Use the error popup structure for success
             
             # Update final GUI status (without repeating the directory path in the status label)
             self._update_gui(f"✅ Splitting complete! Created {segments_created} segments. Prefix: {batch_prefix}", final_dir=output_directory, progress_value=1.0)
@@ -496,60 +1199,44 @@ class VideoSplitterApp(ctk.CTk):
         except RuntimeError as e:
             # Catch all critical errors (RuntimeError) raised
             self._update_gui(text=f"Processing Error", final_error=True)
-            self.after(0, lambda err=str(e): self._show_error_popup(f"VIDEO PROCESSING ERROR:\n\n{err}"))
+            self._gui_queue.put(("popup", (f"VIDEO PROCESSING ERROR:\n\n{e}", False)))
         except Exception as e:
             # Catch generic Python errors (system)
             self._update_gui(text=f"System Error", final_error=True)
-            self.after(0, lambda err=str(e): self._show_error_popup(f"GENERIC SYSTEM ERROR:\n\nType: {e.__class__.__name__}\nMessage: {err}"))
+            self._gui_queue.put(("popup", (f"GENERIC SYSTEM ERROR:\n\nType: {e.__class__.__name__}\nMessage: {e}", False)))
 
         finally:
             # Ensure buttons are re-enabled at the end
-            self.after(0, lambda: self.start_button.configure(state="normal", text="START SPLITTING"))
-            self.after(0, lambda: self.exit_button.configure(state="normal"))
-            self.after(0, lambda: self.progressbar.stop())
-
-
-    def _get_duration(self, file_path):
-        """Gets the video duration in seconds using FFprobe (called from background thread)."""
-        # FFprobe timeout is fixed at 15 seconds as analysis is quick
-        try:
-            duration_str = self._execute_ffprobe([
-                FFPROBE_EXE, "-v", "error", "-show_entries", "format=duration", 
-                "-of", "default=noprint_wrappers=1:nokey=1", file_path
-            ])
-            return math.ceil(float(duration_str)), None
-        except Exception as e:
-            # Catch and return the error for thread handling
-            return 0, str(e)
+            self._split_loop = None
+            self._gui_queue.put(("done", None))
 
 
     def _update_gui(self, text=None, progress_value=None, mode=None, final_dir=None, final_error=False):
-        """Updates GUI elements in a thread-safe manner."""
-        
-        # Helper function for updating
-        def update():
-            # Progress bar mode management
-            if mode == "indeterminate":
-                self.progressbar.configure(mode="indeterminate")
-                self.progressbar.start()
-            elif mode == "determinate":
-                self.progressbar.configure(mode="determinate")
-                self.progressbar.stop()
-            
-            if progress_value is not None:
-                self.progressbar.set(progress_value)
-            
-            if text is not None:
-                # Only display text in the status label if it's not a critical error (which uses the popup)
-                if final_error:
-                     self.progress_label.configure(text=text, text_color="#FF4040") 
-                elif final_dir:
-                    self.progress_label.configure(text=f"{text}\nFiles saved in: {final_dir}", text_color="white")
-                else:
-                    self.progress_label.configure(text=text, text_color="white") 
-
-        # Execute the update function on the main thread
-        self.after(0, update)
+        """Updates GUI elements in a thread-safe manner (applied by _drain_gui_queue)."""
+        self._gui_queue.put(("update", dict(text=text, progress_value=progress_value, mode=mode,
+                                            final_dir=final_dir, final_error=final_error)))
+
+    def _apply_gui_update(self, text=None, progress_value=None, mode=None, final_dir=None, final_error=False):
+        """Applies an _update_gui message on the main thread."""
+        # Progress bar mode management
+        if mode == "indeterminate":
+            self.progressbar.configure(mode="indeterminate")
+            self.progressbar.start()
+        elif mode == "determinate":
+            self.progressbar.configure(mode="determinate")
+            self.progressbar.stop()
+        
+        if progress_value is not None:
+            self.progressbar.set(progress_value)
+        
+        if text is not None:
+            # Only display text in the status label if it's not a critical error (which uses the popup)
+            if final_error:
+                 self.progress_label.configure(text=text, text_color="#FF4040") 
+            elif final_dir:
+                self.progress_label.configure(text=f"{text}\nFiles saved in: {final_dir}", text_color="white")
+            else:
+                self.progress_label.configure(text=text, text_color="white")
 
 
 if __name__ == "__main__":